@@ -11,7 +11,7 @@ It:
   - Computes the half-life (in seconds) and its 95% confidence interval.
   - Computes the hourly survival probability (e.g. "a record has a 75% survival ratio every hour").
   - Plots the Kaplan–Meier survival curve (observed) along with the exponential model fit,
-    using seaborn for styling.
+    using matplotlib's seaborn whitegrid style.
   - Outputs model summary information in a neat formatted table.
   
 Note:
@@ -20,9 +20,9 @@ Note:
       half-life = μ * ln(2)
       hourly survival = exp(-3600/μ)
   
-Dependencies: pandas, numpy, matplotlib, seaborn, lifelines, tabulate
+Dependencies: pandas, numpy, matplotlib, lifelines, tabulate
 Install any missing packages via pip, e.g.:
-    pip install pandas numpy matplotlib seaborn lifelines tabulate
+    pip install pandas numpy matplotlib lifelines tabulate
 """
 import warnings
 warnings.filterwarnings("ignore")
@@ -31,32 +31,32 @@ warnings.filterwarnings("ignore")
 import math
 import numpy as np
 import pandas as pd
+import matplotlib
+matplotlib.use("Agg")  # Plots are only saved to files; skip loading a GUI backend.
 import matplotlib.pyplot as plt
-import seaborn as sns
 from tabulate import tabulate
 
 from lifelines import KaplanMeierFitter, ExponentialFitter
 
 def main():
-    sns.set(style="whitegrid")
+    plt.style.use("seaborn-v0_8-whitegrid")
 
-    # Read CSV data
-    df = pd.read_csv("churns.csv")
-    # Ensure time_s is numeric
-    df["time_s"] = pd.to_numeric(df["time_s"], errors="raise")
+    # Read CSV data; parsing time_s straight into a numeric dtype also ensures it is numeric.
+    df = pd.read_csv("churns.csv", usecols=["pubkey", "time_s"], dtype={"time_s": np.float32}, engine="c")
 
     # durations = time until event (or censoring)
-    durations = df["time_s"].values
+    time_s = df["time_s"].to_numpy(copy=False)
     # event: 1 if churned (time_s > 0), 0 if still active (time_s == 0)
-    events = (df["time_s"] > 0).astype(int).values
+    churned = time_s > 0
+    events = churned.astype(np.int8)
 
     if events.sum() == 0:
         print("No churn events observed; cannot fit model.")
         return
 
     # For right-censored records (time_s == 0), set duration to the maximum observed churn time.
-    censor_time = df.loc[df["time_s"] > 0, "time_s"].max()
-    durations = np.where(durations == 0, censor_time, durations)
+    censor_time = time_s[churned].max()
+    durations = np.where(churned, time_s, censor_time)
 
     # Data check printout
     data_summary = [
@@ -107,7 +107,7 @@ def main():
 
     fig, ax = plt.subplots(figsize=(8, 6))
     kmf.plot(ax=ax, ci_show=True, label="Observed Survival")
-    sns.lineplot(x=t_values, y=exp_survival, ax=ax, linestyle="--", color="red", label="Exponential Fit")
+    ax.plot(t_values, exp_survival, linestyle="--", color="red", label="Exponential Fit")
 
     ax.set_xlabel("Time (s)")
     ax.set_ylabel("Survival Probability")
@@ -115,7 +115,7 @@ def main():
     plt.legend()
     plt.tight_layout()
     plt.savefig("survival_plot.png")
-    plt.show()
+    plt.close(fig)
 
 if __name__ == "__main__":
     main()
@@ -19,58 +19,117 @@ warnings.filterwarnings("ignore")
 
 import os
 import glob
+from concurrent.futures import ProcessPoolExecutor
 import math
 import numpy as np
 import pandas as pd
+import matplotlib
+matplotlib.use("Agg")  # Plots are only saved to files; skip loading a GUI backend.
 import matplotlib.pyplot as plt
 import seaborn as sns
 from tabulate import tabulate
 from scipy.optimize import curve_fit
 from scipy.stats import t
+from fit_cache import fit_weibull_cached
 
 def weibull_model(t, lambd, k):
     """Weibull survival model: S(t) = exp[-(t/λ)^k]"""
     return np.exp(- (t / lambd)**k)
 
+def weibull_jac(t, lambd, k):
+    """Analytic Jacobian of weibull_model with respect to (λ, k), shape (N, 2)."""
+    x = t / lambd
+    xk = x**k
+    e = np.exp(-xk)
+    d_lambd = (k / lambd) * xk * e
+    # Clip to keep log(0) finite at t = 0, where xk is 0 anyway.
+    d_k = -xk * np.log(np.clip(x, 1e-300, None)) * e
+    return np.stack([d_lambd, d_k], axis=-1)
+
+def fit_weibull_params(t_vals, survival_obs):
+    """Fit the Weibull model to already loaded survival data.
+       Returns: fitted parameters (lambd, k)."""
+    # Initial guess: λ ~ mean(time) and k = 1.0.
+    initial_guess = [np.mean(t_vals), 1.0]
+    popt, _ = curve_fit(weibull_model, t_vals, survival_obs, p0=initial_guess,
+                       jac=weibull_jac, maxfev=10000)
+    lambd_weib, k_weib = popt
+    return lambd_weib, k_weib
+
 def fit_weibull(file_path):
     """Load data from a file, compute survival, and fit the Weibull model.
-       Returns: fitted parameters (lambd, k) and the processed DataFrame."""
-    df = pd.read_csv(file_path)
-    df["timestamp"] = pd.to_numeric(df["timestamp"], errors="raise")
-    df["node_count"] = pd.to_numeric(df["node_count"], errors="raise")
+       Returns: (file_path, data, lambd, k), where data holds the "time" and "survival" arrays."""
+    df = pd.read_csv(file_path, usecols=["timestamp", "node_count"],
+                     dtype={"timestamp": np.int64, "node_count": np.int32}, engine="c")
+    
+    timestamps = df["timestamp"].to_numpy()
+    node_counts = df["node_count"].to_numpy()
     
     # Use maximum observed node_count as the initial count.
-    initial_count = df["node_count"].max()
-    df["survival"] = df["node_count"] / initial_count
-    df["time"] = df["timestamp"] - df["timestamp"].min()
+    initial_count = node_counts.max()
+    survival_obs = node_counts / initial_count
+    t_vals = timestamps - timestamps.min()
     
-    t_vals = df["time"].values
-    survival_obs = df["survival"].values
+    lambd_weib, k_weib = fit_weibull_params(t_vals, survival_obs)
+    # Plain arrays are cheaper than a DataFrame to pickle between processes and into the cache.
+    data = {"time": t_vals, "survival": survival_obs}
+    return file_path, data, lambd_weib, k_weib
+
+def set_plot_style():
+    """Set seaborn style for attractive plots (also run in each worker process)."""
+    sns.set(style="whitegrid", context="talk", palette="deep")
+
+# Figure reused by every plot_one call in the same process; building a new figure per file is costly.
+_plot_figure = None
+
+def plot_one(args):
+    """Save the survival plot of a single file (with formula annotation)."""
+    global _plot_figure
+    idx, (file, df, lambd_weib, k_weib) = args
+    if _plot_figure is None:
+        _plot_figure = plt.subplots(figsize=(10, 7))
+    fig, ax = _plot_figure
+    ax.cla()
+    # Start tight_layout from the default margins rather than the previous file's.
+    fig.subplots_adjust(**{param: plt.rcParams[f"figure.subplot.{param}"]
+                           for param in ("left", "right", "bottom", "top", "wspace", "hspace")})
+    # Plot observed survival.
+    ax.step(df["time"], df["survival"], where="post", label="Observed Survival",
+            color=sns.color_palette("deep")[0], marker="o", markersize=6)
+    # Plot the fitted Weibull curve.
+    t_vals = np.linspace(0, df["time"].max(), 200)
+    model_fit = weibull_model(t_vals, lambd_weib, k_weib)
+    ax.plot(t_vals, model_fit, linestyle="--", color=sns.color_palette("deep")[1],
+            linewidth=3, label="Weibull Fit")
+    # Annotate the plot with the Weibull model formula.
+    model_text = r'$S(t)=\exp\left[-\left(\frac{t}{%.2f}\right)^{%.3f}\right]$' % (lambd_weib, k_weib)
+    ax.text(0.25, 0.95, model_text, transform=ax.transAxes,
+            fontsize=14, verticalalignment='top',
+            bbox=dict(boxstyle="round,pad=0.3", fc="white", ec="gray", lw=1))
     
-    # Initial guess: λ ~ mean(time) and k = 1.0.
-    initial_guess = [np.mean(t_vals), 1.0]
-    popt, _ = curve_fit(weibull_model, t_vals, survival_obs, p0=initial_guess, maxfev=10000)
-    lambd_weib, k_weib = popt
-    return lambd_weib, k_weib, df
+    ax.set_xlabel("Time (s) [Relative]")
+    ax.set_ylabel("Survival Probability")
+    ax.set_title(f"File: {os.path.basename(file)}")
+    ax.legend()
+    sns.despine(trim=True)
+    
+    fig.tight_layout()
+    fig.savefig(f"plots/node_storing_survival_{idx}.png")
 
-def compute_predictions(lambd, k, horizons, replication_counts):
-    """Compute predicted survival probabilities for given horizons and replication counts.
-       Returns a dictionary of predictions for each replication count and horizon."""
-    predictions = {}
-    for n in replication_counts:
-        preds = {}
-        for label, t_val in horizons.items():
-            # Survival probability for one node at time t.
-            p_single = weibull_model(t_val, lambd, k)
-            # For n nodes: probability that at least one survives (assuming independence).
-            p_multi = 1 - (1 - p_single)**n
-            preds[label] = p_multi
-        predictions[n] = preds
-    return predictions
+def predict_all(lambd_arr, k_arr, t_horizons, rep_counts):
+    """Compute predicted survival probabilities for every run, replication count and horizon at once.
+       Returns an array of shape (runs, replication counts, horizons)."""
+    lambd_arr = np.asarray(lambd_arr, dtype=np.float64)[:, None]
+    k_arr = np.asarray(k_arr, dtype=np.float64)[:, None]
+    t_horizons = np.asarray(t_horizons, dtype=np.float64)[None, :]
+    # Survival probability for one node, shape (runs, horizons).
+    p_single = weibull_model(t_horizons, lambd_arr, k_arr)
+    # For n nodes: probability that at least one survives (assuming independence).
+    rep_counts = np.asarray(rep_counts)[None, :, None]
+    return 1 - (1 - p_single[:, None, :])**rep_counts
 
 def main():
-    # Set seaborn style for attractive plots.
-    sns.set(style="whitegrid", context="talk", palette="deep")
+    set_plot_style()
     
     # ---------------------------
     # Load Multiple Runs and Store Data
@@ -79,21 +138,17 @@ def main():
     if not files:
         raise FileNotFoundError("No files found matching the pattern 'run_*.csv'")
     
-    # Create lists to store aggregated parameters and file data.
-    lambda_list = []
-    k_list = []
-    predictions_all = []  # Store (λ, k) for each run.
-    all_file_data = []    # Store tuples of (file, df, λ, k) for plotting.
-    
-    for file in files:
-        lambd_weib, k_weib, df = fit_weibull(file)
-        lambda_list.append(lambd_weib)
-        k_list.append(k_weib)
-        predictions_all.append((lambd_weib, k_weib))
-        all_file_data.append((file, df, lambd_weib, k_weib))
+    # Files are fitted and plotted independently, so both phases run across all cores.
+    os.makedirs("plots", exist_ok=True)
+    with ProcessPoolExecutor(initializer=set_plot_style) as executor:
+        # Store tuples of (file, df, λ, k) for plotting.
+        # Fits of unchanged files are loaded from the on-disk cache instead of being recomputed.
+        all_file_data = fit_weibull_cached(files, fit_weibull, map_func=executor.map)
+        # Save Individual Plots for Each File (with formula annotation).
+        list(executor.map(plot_one, enumerate(all_file_data, start=1)))
     
-    lambda_array = np.array(lambda_list)
-    k_array = np.array(k_list)
+    lambda_array = np.array([lambd_weib for _, _, lambd_weib, _ in all_file_data])
+    k_array = np.array([k_weib for _, _, _, k_weib in all_file_data])
     n_samples = len(lambda_array)
     
     # Compute t-based 95% CI for the Weibull parameters.
@@ -119,36 +174,6 @@ def main():
     print(tabulate(summary_table, headers=["Parameter", "Mean", f"{ci}% CI"], tablefmt="pretty"))
     print()
     
-    # ---------------------------
-    # Save Individual Plots for Each File (with formula annotation)
-    # ---------------------------
-    os.makedirs("plots", exist_ok=True)
-    for idx, (file, df, lambd_weib, k_weib) in enumerate(all_file_data, start=1):
-        fig, ax = plt.subplots(figsize=(10, 7))
-        # Plot observed survival.
-        ax.step(df["time"], df["survival"], where="post", label="Observed Survival",
-                color=sns.color_palette("deep")[0], marker="o", markersize=6)
-        # Plot the fitted Weibull curve.
-        t_vals = np.linspace(0, df["time"].max(), 200)
-        model_fit = weibull_model(t_vals, lambd_weib, k_weib)
-        ax.plot(t_vals, model_fit, linestyle="--", color=sns.color_palette("deep")[1],
-                linewidth=3, label="Weibull Fit")
-        # Annotate the plot with the Weibull model formula.
-        model_text = r'$S(t)=\exp\left[-\left(\frac{t}{%.2f}\right)^{%.3f}\right]$' % (lambd_weib, k_weib)
-        ax.text(0.25, 0.95, model_text, transform=ax.transAxes,
-                fontsize=14, verticalalignment='top',
-                bbox=dict(boxstyle="round,pad=0.3", fc="white", ec="gray", lw=1))
-        
-        ax.set_xlabel("Time (s) [Relative]")
-        ax.set_ylabel("Survival Probability")
-        ax.set_title(f"File: {os.path.basename(file)}")
-        ax.legend()
-        sns.despine(trim=True)
-        
-        fig.tight_layout()
-        fig.savefig(f"plots/node_storing_survival_{idx}.png")
-        plt.close(fig)
-    
     # ---------------------------
     # Create Master Plot (All Files + Mean Weibull Model with formula)
     # ---------------------------
@@ -198,31 +223,21 @@ def main():
     # Replication counts to predict for.
     replication_counts = [1, 2, 4, 10, 20, 50, 100, 1_000]
     
-    # Gather predictions from each run.
-    predictions_dict = {n: {label: [] for label in horizons} for n in replication_counts}
-    for lambd_val, k_val in predictions_all:
-        for n in replication_counts:
-            for label, t_val in horizons.items():
-                p_single = weibull_model(t_val, lambd_val, k_val)
-                p_multi = 1 - (1 - p_single)**n
-                predictions_dict[n][label].append(p_multi)
+    # Gather predictions from each run, indexed as [run, replication count, horizon].
+    predictions = predict_all(lambda_array, k_array, list(horizons.values()), replication_counts)
+    
+    # Compute mean and t-based % CI for each prediction, reducing over runs in one pass.
+    # There is one prediction per run, so the parameter t_crit and n_samples apply unchanged.
+    pred_mean = predictions.mean(axis=0)
+    pred_std = predictions.std(axis=0, ddof=1)
+    # Lower CI is not negative and upper CI is capped at 1 (i.e., 100%).
+    pred_ci_lower = np.clip(pred_mean - t_crit * (pred_std / np.sqrt(n_samples)), 0, 1)
+    pred_ci_upper = np.clip(pred_mean + t_crit * (pred_std / np.sqrt(n_samples)), 0, 1)
     
-    # Compute mean and t-based % CI for each prediction.
     prediction_table = []
-    for n in replication_counts:
+    for i, n in enumerate(replication_counts):
         row = [n]
-        for label in horizons:
-            p_vals = np.array(predictions_dict[n][label])
-            mean_pred = np.mean(p_vals)
-            std_pred = np.std(p_vals, ddof=1)
-            n_pred = len(p_vals)
-            t_crit_pred = t.ppf(ci_fraq, df=n_pred - 1)
-            ci_lower = mean_pred - t_crit_pred * (std_pred / np.sqrt(n_pred))
-            ci_upper = mean_pred + t_crit_pred * (std_pred / np.sqrt(n_pred))
-            # Ensure lower CI is not negative.
-            ci_lower = max(0, ci_lower)
-            # Cap the upper CI at 1 (i.e., 100%) if it exceeds the bound.
-            ci_upper = min(1, ci_upper)
+        for mean_pred, ci_lower, ci_upper in zip(pred_mean[i], pred_ci_lower[i], pred_ci_upper[i]):
             row.append(f"{mean_pred*100:.2f}% ({ci_lower*100:.2f}-{ci_upper*100:.2f}%)")
         prediction_table.append(row)
     
@@ -234,18 +249,8 @@ def main():
     # New Table: Lower % CI Intervals Only (with negative values capped at 0)
     # ---------------------------
     lower_ci_table = []
-    for n in replication_counts:
-        row = [n]
-        for label in horizons:
-            p_vals = np.array(predictions_dict[n][label])
-            std_pred = np.std(p_vals, ddof=1)
-            mean_pred = np.mean(p_vals)
-            n_pred = len(p_vals)
-            t_crit_pred = t.ppf(ci_fraq, df=n_pred - 1)
-            ci_lower = mean_pred - t_crit_pred * (std_pred / np.sqrt(n_pred))
-            # Cap lower CI at 0 if negative.
-            ci_lower = max(0, ci_lower)
-            row.append(f"{ci_lower*100:.2f}%")
+    for i, n in enumerate(replication_counts):
+        row = [n] + [f"{ci_lower*100:.2f}%" for ci_lower in pred_ci_lower[i]]
         lower_ci_table.append(row)
     
     print(f"\nLower {ci}% CI Intervals for Predicted Survival Probabilities:")
@@ -271,17 +276,14 @@ def main():
         # => t_max = λ_lower * (-ln(1 - (1 - target)^(1/n)))^(1/k_upper)
         return lambda_lower * (-np.log(1 - (1 - target)**(1/n)))**(1/k_upper)
     
-    nonsteady_optimal_cost = float('inf')
-    nonsteady_optimal_n = None
-    nonsteady_optimal_t = None
-    for n in range(1, 101):
-        t_val = t_max(n, lambda_ci_lower, k_ci_upper, target_availability)
-        t_val_hours = t_val / 3600.0
-        cost = n / t_val_hours
-        if cost < nonsteady_optimal_cost:
-            nonsteady_optimal_cost = cost
-            nonsteady_optimal_n = n
-            nonsteady_optimal_t = t_val
+    # Evaluate replication counts 1..100 in one broadcast.
+    n_candidates = np.arange(1, 101)
+    t_vals = t_max(n_candidates, lambda_ci_lower, k_ci_upper, target_availability)
+    costs = n_candidates / (t_vals / 3600.0)
+    best = np.argmin(costs)
+    nonsteady_optimal_cost = float(costs[best])
+    nonsteady_optimal_n = int(n_candidates[best])
+    nonsteady_optimal_t = float(t_vals[best])
     nonsteady_optimal_t_hours = nonsteady_optimal_t / 3600.0
 
     print(f"\nOptimal Configuration for ≥{target_availability * 100}% Availability (worst-case):")
@@ -301,31 +303,21 @@ def main():
     min_nodes = 5
 
     def A_min(T, lambda_lower, k_upper, max_batches=1000):
-        total = 0.0
-        for j in range(1, max_batches + 1):
-            term = math.exp(-((j * T) / lambda_lower) ** k_upper)
-            if term < 1e-12:
-                break
-            total += term
-        return total
+        # Sum all batch terms at once; terms below ~1e-12 contribute nothing to the total.
+        # T may be a scalar or an array of intervals (one sum per interval).
+        j = np.arange(1, max_batches + 1, dtype=np.float64)
+        T = np.asarray(T, dtype=np.float64)[..., None]
+        return np.exp(-((j * T) / lambda_lower) ** k_upper).sum(axis=-1)
     
-    steady_optimal_cost = float('inf')
-    steady_optimal_T = None  # in seconds
-    steady_optimal_R = None
-    for T in np.linspace(3600, 5*24*3600, 500):  # from 1 hour to 5 days
-        A_val = A_min(T, lambda_ci_lower, k_ci_upper)
-        if A_val <= 0:
-            continue
-        R_min = threshold / A_val
-        R_min_int = math.ceil(R_min)
-        if R_min_int < min_nodes:
-            R_min_int = min_nodes
-        T_hours = T / 3600.0
-        cost = R_min_int / T_hours
-        if cost < steady_optimal_cost:
-            steady_optimal_cost = cost
-            steady_optimal_T = T
-            steady_optimal_R = R_min_int
+    # Evaluate every candidate interval in one broadcast, from 1 hour to 5 days.
+    T_candidates = np.linspace(3600, 5*24*3600, 500)
+    A_vals = A_min(T_candidates, lambda_ci_lower, k_ci_upper)
+    R_min = np.maximum(min_nodes, np.ceil(threshold / A_vals))
+    costs = R_min / (T_candidates / 3600.0)
+    best = np.argmin(costs)
+    steady_optimal_cost = float(costs[best])
+    steady_optimal_T = float(T_candidates[best])  # in seconds
+    steady_optimal_R = int(R_min[best])
     steady_optimal_T_hours = steady_optimal_T / 3600.0
 
     print(f"\nSteady-State Optimal Configuration for ≥{target_steady * 100}% Availability:")
@@ -0,0 +1,50 @@
+#!/usr/bin/env python3
+"""
+Disk memoization of per-file Weibull fits.
+
+Fitting a run with curve_fit is the slowest step of the analysis, so results are
+stored in "./.fit_cache.pkl" keyed by (absolute path, mtime, size) of the CSV file.
+A rerun on unchanged files loads the cached results without reading the CSVs
+or calling curve_fit again. Editing or replacing a file invalidates its entry.
+"""
+
+import os
+import pickle
+
+CACHE_PATH = ".fit_cache.pkl"
+# Bump whenever the fitting procedure or the shape of the cached results changes.
+CACHE_VERSION = 3
+
+def _cache_key(file_path):
+    stat = os.stat(file_path)
+    return (os.path.abspath(file_path), stat.st_mtime_ns, stat.st_size)
+
+def _load_cache():
+    try:
+        with open(CACHE_PATH, "rb") as f:
+            version, cache = pickle.load(f)
+    except (OSError, pickle.UnpicklingError, EOFError, ValueError, TypeError):
+        return {}
+    return cache if version == CACHE_VERSION else {}
+
+def _save_cache(cache):
+    tmp_path = CACHE_PATH + ".tmp"
+    with open(tmp_path, "wb") as f:
+        pickle.dump((CACHE_VERSION, cache), f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp_path, CACHE_PATH)
+
+def fit_weibull_cached(files, fit_weibull, map_func=map):
+    """Return fit_weibull(file) for each file, reusing cached results for unchanged files.
+       Only the files missing from the cache are passed to map_func(fit_weibull, ...)."""
+    cache = _load_cache()
+    keys = [_cache_key(file) for file in files]
+    missing = [(file, key) for file, key in zip(files, keys) if key not in cache]
+    if missing:
+        results = map_func(fit_weibull, [file for file, _ in missing])
+        for (_, key), result in zip(missing, results):
+            # Drop stale entries for a file that has since changed on disk.
+            for old_key in [k for k in cache if k[0] == key[0]]:
+                del cache[old_key]
+            cache[key] = result
+        _save_cache(cache)
+    return [cache[key] for key in keys]